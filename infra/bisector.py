@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+# Copyright 2019 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+################################################################################
+"""Uses git bisection to find the commit where a bug was introduced.
+
+This module takes a newer and an older commit SHA for the main repo of an
+OSS-Fuzz project. It clones the project repo locally, validates that both
+commits exist and prepares the clone for running git bisect between them.
+"""
+import argparse
+import atexit
+import concurrent.futures
+import functools
+import mmap
+import os
+import re
+import shutil
+import subprocess
+import threading
+
+from helper import _check_project_exists
+from helper import _get_dockerfile_path
+
+LOCAL_GIT_DIR = 'tmp_git'
+
+_HEX_SHA_RE = re.compile(r'^[0-9a-f]{4,40}$', re.IGNORECASE)
+
+_repo_paths = {}
+
+
+def _repo_path(project_name):
+  """Returns the local repo directory for a project, cached per project."""
+  path = _repo_paths.get(project_name)
+  if path is None:
+    path = os.path.join(LOCAL_GIT_DIR, project_name)
+    _repo_paths[project_name] = path
+  return path
+
+
+class _CatFileBatch:
+  """A long-lived git cat-file --batch-check coprocess for one repo.
+
+  Spawning git once and streaming object names over its stdin amortizes the
+  fork/exec and object-cache warmup cost over every query the bisection loop
+  makes, instead of paying it per probe.
+  """
+
+  def __init__(self, repo_dir):
+    self.process = subprocess.Popen(
+        ['git', '-C', repo_dir, 'cat-file',
+         '--batch-check=%(objectname) %(objecttype)'],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL)
+    self.lock = threading.Lock()
+
+  def object_exists(self, name):
+    """Returns True if |name| resolves to an object in the repo.
+
+    Raises:
+      RuntimeError: The coprocess died and gave no answer.
+    """
+    with self.lock:
+      self.process.stdin.write(name.encode() + b'\n')
+      self.process.stdin.flush()
+      line = self.process.stdout.readline()
+    if not line:
+      # An empty read means the coprocess died (e.g. the repo directory was
+      # removed out from under it); without this check a dead coprocess
+      # would report every object as existing.
+      raise RuntimeError('git cat-file coprocess exited unexpectedly')
+    return not line.rstrip().endswith(b'missing')
+
+  def close(self):
+    """Shuts down the coprocess."""
+    try:
+      self.process.stdin.close()
+    except BrokenPipeError:
+      pass
+    self.process.wait()
+
+
+_cat_file_batches = {}
+_cat_file_batches_lock = threading.Lock()
+
+
+def _get_cat_file_batch(project_name):
+  """Returns the cat-file coprocess for a project, starting it on first use.
+
+  Creation is guarded by a lock: the concurrent commit_exists probes in
+  main() may both miss a cold cache, and without the lock one of the two
+  coprocesses they spawn would be leaked when its dict entry is overwritten.
+  """
+  with _cat_file_batches_lock:
+    batch = _cat_file_batches.get(project_name)
+    if batch is None:
+      batch = _CatFileBatch(_repo_path(project_name))
+      _cat_file_batches[project_name] = batch
+    return batch
+
+
+@atexit.register
+def _close_cat_file_batches():
+  """Tears down any cat-file coprocesses still running at exit."""
+  with _cat_file_batches_lock:
+    for batch in _cat_file_batches.values():
+      batch.close()
+    _cat_file_batches.clear()
+
+
+class ProjectNotFoundException(Exception):
+  """The project was not found in the OSS-Fuzz projects directory."""
+
+
+class NoRepoFoundException(Exception):
+  """The main repo of a project could not be inferred from its Dockerfile."""
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      description='git bisection for finding the introduction of a bug')
+
+  parser.add_argument(
+      '-p',
+      '--project_name',
+      help='The name of the project where the bug occurred',
+      required=True)
+  parser.add_argument(
+      '-n',
+      '--commit_new',
+      help='The newest commit SHA to be bisected',
+      required=True)
+  parser.add_argument(
+      '-o',
+      '--commit_old',
+      help='The oldest commit SHA to be bisected',
+      required=True)
+  args = parser.parse_args()
+
+  repo_name = infer_main_repo(args.project_name)
+  clone_repo_local(repo_name, args.commit_old, args.commit_new)
+  local_name = repo_name.split('/')[-1].replace('.git', '')
+
+  # The two validation probes are independent and subprocess-bound, so they
+  # are issued concurrently and their fork/exec latencies overlap.
+  with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+    futures = {
+        executor.submit(commit_exists, commit, local_name): commit
+        for commit in (args.commit_new, args.commit_old)
+    }
+    valid = True
+    for future in concurrent.futures.as_completed(futures):
+      if not future.result():
+        print('Error: commit %s does not exist in %s' % (futures[future],
+                                                         repo_name))
+        valid = False
+  if not valid:
+    return
+  # The clone is left in place on purpose: clone_repo_local detects it on
+  # the next run and refreshes it with a fetch instead of re-downloading.
+
+
+def run_command_in_repo(command, project_name):
+  """Runs a command in the project's local git repo.
+
+  Output is returned as raw bytes: most callers only look at the return
+  code or do substring checks, so callers that need text decode with
+  .decode('utf-8', 'replace') at the use site.
+
+  Args:
+    command: The command to be run, as a list of arguments.
+    project_name: The name of the directory the repo was cloned into.
+
+  Returns:
+    The stdout and stderr of the command as bytes, and its return code.
+  """
+  result = subprocess.run(
+      command,
+      cwd=_repo_path(project_name),
+      capture_output=True,
+      check=False)
+  return result.stdout, result.stderr, result.returncode
+
+
+def run_command_in_tmp(command):
+  """Runs a command in the local git directory.
+
+  Args:
+    command: The command to be run, as a list of arguments.
+
+  Returns:
+    The stdout and stderr of the command as bytes, and its return code.
+  """
+  result = subprocess.run(
+      command,
+      cwd=LOCAL_GIT_DIR,
+      capture_output=True,
+      check=False)
+  return result.stdout, result.stderr, result.returncode
+
+
+def commit_exists(commit, project_name):
+  """Checks if a commit exists in the project's local git repo.
+
+  Queries the repo's persistent cat-file coprocess, an object-database
+  lookup that avoids both walking branch refs and spawning a git process
+  per check.
+
+  Args:
+    commit: The commit SHA to be checked.
+    project_name: The name of the directory the repo was cloned into.
+
+  Returns:
+    True if the commit exists in the repo.
+  """
+  if not commit or commit.isspace():
+    return False
+  return _get_cat_file_batch(project_name).object_exists(commit + '^{commit}')
+
+
+def commit_reachable(commit, project_name, ref='HEAD'):
+  """Checks if a commit is an ancestor of a ref in the project's repo.
+
+  git merge-base --is-ancestor walks only the history between the two
+  commits and exits early, unlike enumerating every branch with
+  git branch --contains. Use commit_exists for pure existence checks; this
+  helper is for the bisection steps that need containment semantics.
+
+  Args:
+    commit: The commit SHA to be checked.
+    project_name: The name of the directory the repo was cloned into.
+    ref: The ref the commit must be reachable from.
+
+  Returns:
+    True if the commit is an ancestor of ref.
+  """
+  if not commit or commit.isspace():
+    return False
+  _, _, returncode = run_command_in_repo(
+      ['git', 'merge-base', '--is-ancestor', commit, ref], project_name)
+  return returncode == 0
+
+
+def clone_repo_local(repo_name, commit_old=None, commit_new=None):
+  """Clones a repo into the local git directory.
+
+  The clone is blobless and skips the checkout: bisection only needs the
+  commit graph up front, and git fetches the blobs for a commit lazily when
+  that commit is checked out. Requires git >= 2.22 for partial clone support.
+
+  When both ends of the bisection range are known and commit_old is a ref
+  name the server can resolve (--shallow-exclude rejects raw SHA
+  expressions), only the commits newer than it are fetched: the clone
+  starts at depth 1 and is deepened with a shallow-exclude fetch. Raw SHA
+  endpoints get a plain full-history clone. Either way every branch is
+  fetched, so commits that only exist on non-default branches are still
+  found.
+
+  If a clone from a previous run is already present and its origin matches
+  repo_name, it is refreshed with a fetch instead of being re-downloaded.
+
+  Args:
+    repo_name: The url of the repo to be cloned.
+    commit_old: The oldest commit in the bisection range, if known.
+    commit_new: The newest commit in the bisection range, if known.
+  """
+  local_name = repo_name.split('/')[-1].replace('.git', '')
+  repo_dir = _repo_path(local_name)
+  if os.path.isdir(repo_dir):
+    origin, _, returncode = run_command_in_repo(
+        ['git', 'remote', 'get-url', 'origin'], local_name)
+    origin = origin.decode('utf-8', 'replace').strip()
+    if returncode == 0 and origin == repo_name:
+      run_command_in_repo(['git', 'fetch', '--all', '--prune'], local_name)
+      return
+  _close_cat_file_batches()
+  remove(repo_dir)
+  os.makedirs(LOCAL_GIT_DIR, exist_ok=True)
+  shallow = bool(commit_old and commit_new and
+                 not _HEX_SHA_RE.match(commit_old))
+  clone_command = ['git', 'clone', '--filter=blob:none', '--no-checkout']
+  if shallow:
+    # --depth implies --single-branch; keep every branch tip so commits
+    # that only exist on non-default branches are still fetched.
+    clone_command += ['--depth', '1', '--no-single-branch']
+  run_command_in_tmp(clone_command + [repo_name])
+  if shallow:
+    _, _, returncode = run_command_in_repo(
+        ['git', 'fetch', '--shallow-exclude=%s' % commit_old, 'origin',
+         commit_new], local_name)
+    if returncode != 0:
+      # The remote rejected the shallow fetch; restore parity with a full
+      # clone. --unshallow alone only deepens the default branch, so fetch
+      # every branch explicitly.
+      run_command_in_repo(
+          ['git', 'fetch', '--unshallow', 'origin',
+           '+refs/heads/*:refs/remotes/origin/*'], local_name)
+
+
+@functools.lru_cache(maxsize=None)
+def _project_exists(project_name):
+  """Memoized _check_project_exists, which stats the projects directory."""
+  return _check_project_exists(project_name)
+
+
+@functools.lru_cache(maxsize=None)
+def _dockerfile_path(project_name):
+  """Memoized _get_dockerfile_path."""
+  return _get_dockerfile_path(project_name)
+
+
+@functools.lru_cache(maxsize=None)
+def infer_main_repo(project_name):
+  """Attempts to parse the main repo of a project from its Dockerfile.
+
+  Results are memoized per project, so repeated lookups in the same process
+  only parse the Dockerfile once.
+
+  Args:
+    project_name: The name of the OSS-Fuzz project.
+
+  Returns:
+    The url of the main repo.
+
+  Raises:
+    ProjectNotFoundException: The project was not found in OSS-Fuzz.
+    NoRepoFoundException: The main repo could not be inferred.
+  """
+  if not _project_exists(project_name):
+    raise ProjectNotFoundException('No project could be found with name %s' %
+                                   project_name)
+  docker_path = _dockerfile_path(project_name)
+  repo = _search_dockerfile_for_repo(project_name, docker_path)
+  if repo:
+    return repo
+  raise NoRepoFoundException('No repos were found with name %s in docker '
+                             'file %s' % (project_name, docker_path))
+
+
+def _search_dockerfile_for_repo(project_name, docker_path):
+  """Returns the first <url>/<project_name>.git token in the Dockerfile.
+
+  Shells out to grep when available, whose C scan with -m1 short-circuits
+  on the first hit, and falls back to an mmap'ed regex search otherwise.
+
+  Args:
+    project_name: The name of the OSS-Fuzz project.
+    docker_path: The path of the project Dockerfile.
+
+  Returns:
+    The matched token, or None if the Dockerfile does not contain one.
+  """
+  try:
+    result = subprocess.run(
+        ['grep', '-m1', '-oE',
+         r'\S*/%s\.git' % re.escape(project_name), docker_path],
+        capture_output=True,
+        text=True,
+        check=False)
+    if result.returncode == 0:
+      return result.stdout.strip()
+    if result.returncode == 1:
+      return None
+  except OSError:
+    pass
+  pattern = re.compile(br'\S*/%s\.git' % re.escape(project_name).encode())
+  with open(docker_path, 'rb') as fp:
+    with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+      match = pattern.search(mapped)
+      if match:
+        return match.group(0).decode('utf-8')
+  return None
+
+
+def remove(path):
+  """Removes a file or directory, ignoring paths that do not exist.
+
+  Args:
+    path: The file or directory to be removed.
+  """
+  if os.path.isdir(path):
+    shutil.rmtree(path, ignore_errors=True)
+    return
+  try:
+    os.remove(path)
+  except FileNotFoundError:
+    pass
+
+
+if __name__ == '__main__':
+  main()
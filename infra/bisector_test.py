@@ -0,0 +1,71 @@
+# Copyright 2019 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+################################################################################
+"""Tests for bisector.py"""
+import unittest
+
+from bisector import clone_repo_local
+from bisector import commit_exists
+from bisector import commit_reachable
+from bisector import infer_main_repo
+from bisector import LOCAL_GIT_DIR
+from bisector import ProjectNotFoundException
+from bisector import remove
+
+
+class TestBisector(unittest.TestCase):
+  """Tests the bisector module against the curl project."""
+
+  PROJECT_TEST_NAME = 'curl'
+
+  @classmethod
+  def setUpClass(cls):
+    cls.repo_name = infer_main_repo(cls.PROJECT_TEST_NAME)
+    clone_repo_local(cls.repo_name)
+    cls.local_name = cls.repo_name.split('/')[-1].replace('.git', '')
+
+  @classmethod
+  def tearDownClass(cls):
+    remove(LOCAL_GIT_DIR)
+
+  def test_infer_main_repo(self):
+    """Tests that the main repo can be inferred based on the Dockerfile."""
+    repo_name = infer_main_repo('curl')
+    self.assertEqual(repo_name, 'https://github.com/curl/curl.git')
+    repo_name = infer_main_repo('yara')
+    self.assertEqual(repo_name, 'https://github.com/VirusTotal/yara.git')
+    with self.assertRaises(ProjectNotFoundException):
+      infer_main_repo('not-a-real-project')
+
+  def test_commit_exists(self):
+    """Tests that a commit can be detected in the project's repo."""
+    self.assertTrue(
+        commit_exists('bc5d22c3dede2f04870c37aec9a50474c4b888ad',
+                      self.local_name))
+    self.assertFalse(commit_exists('bad-commit-sha', self.local_name))
+    self.assertFalse(commit_exists('', self.local_name))
+    self.assertFalse(commit_exists(' ', self.local_name))
+
+  def test_commit_reachable(self):
+    """Tests that ancestors of HEAD are detected as reachable."""
+    self.assertTrue(
+        commit_reachable('bc5d22c3dede2f04870c37aec9a50474c4b888ad',
+                         self.local_name))
+    self.assertFalse(commit_reachable('bad-commit-sha', self.local_name))
+    self.assertFalse(commit_reachable('', self.local_name))
+
+
+if __name__ == '__main__':
+  unittest.main()